@@ -1,13 +1,16 @@
 import sys
 import os.path
 import time
+from collections import OrderedDict
+import numpy as np
 from visa_io import VisaInstrument
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 class DSOX1000(VisaInstrument):
-    def __init__(self, address='USB0::0x2A8D::0x1797::CN57266528::0::INSTR', my_name="my_DSOX100_Scope"):
+    def __init__(self, address='USB0::0x2A8D::0x1797::CN57266528::0::INSTR', my_name="my_DSOX100_Scope",
+                 resource_manager=None, verbose=True):
         # Variables
         self.properties = {
             'Name': my_name,
@@ -15,20 +18,129 @@ class DSOX1000(VisaInstrument):
             'Channels': 2,
             'Channels_V_per_Div': [.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0],
             'WGEN_VPP_MAX': 12,
-            'WGEN_VPP_Current': 12
+            'WGEN_VPP_Current': 12,
+            'WGEN_Load_Current': 'ONEMeg',
+            'FRA_Input_Current': 1,
+            'FRA_Output_Current': 2,
+            'FRA_WGEN_VPP_Current': None,       # unknown until frequency_analysis_wave_gen_voltage() is called
+            'Segments_MAX': 1000,
+            'Segments_Per_Query': 50,           # time tag queries chained into one read by get_segments()
+            'Timebase_Scale_Current': None,     # unknown until timebase_scale() is called
+            'Acquire_Type_Current': 'NORMal',
+            'Acquire_Count_Current': 1,
+            'Timeout_Quick_ms': 2000,           # settings and simple queries
+            'Timeout_Transfer_ms': 5000,        # extra allowance for binary block reads
+            'Transfer_Bytes_per_Second': 250000,    # conservative link rate, sizes large block read timeouts
+            'Timeout_Autoscale_ms': 15000,
+            'Timeout_FRA_ms': 600000,           # frequency_analysis_run() wait for the sweep to finish
+            'Timeout_Max_ms': 600000,
+            'Timebase_MIN': 5e-9,
+            'Timebase_MAX': 50.0,
+            'Autoset_Points': 2000,             # samples per autoset_fast() capture
+            'Autoset_Coarse_Timebase': 5e-3,    # PEAK detect amplitude capture
+            'Autoset_Timebases': [1e-7, 5e-6, 2e-4, 1e-2, 1e-1],  # frequency search, fast to slow
+            'Autoset_Min_Cycles': 3,            # periods a frequency search capture must show
+            'Autoset_Fill_Div': 6,              # vertical divisions the signal should fill (of 8)
+            'Autoset_Periods': 3                # periods across the screen
         }
+        # Last-known settings, keyed by command header, replayed after a reconnect.
+        self.state = OrderedDict()
+        # autoset_fast() results, keyed by (channel, fingerprint).
+        self.autoset_cache = {}
 
-        VisaInstrument.__init__(self, name=my_name, visa_address=address)
+        VisaInstrument.__init__(self, name=my_name, visa_address=address, resource_manager=resource_manager,
+                                verbose=verbose)
 
-    def send_visa_cmd(self, cmd, query=False, ascii=True, single_value=True, verbose=False):
+    def send_visa_cmd(self, cmd, query=False, ascii=True, single_value=True, verbose=False, timeout=None):
+        # timeout: visa timeout in milliseconds, default command_timeout().
         if verbose:
             print("send_visa_cmd: cmd: %s" % str(cmd))
 
-        r = self.cmd(cmd, query=query, ascii=ascii, single_value=single_value, verbose=verbose)
+        r = self.cmd(cmd, query=query, ascii=ascii, single_value=single_value, verbose=verbose, timeout=timeout)
+        if not query:
+            self.remember_setting(cmd)
         if verbose:
             print("send_visa_cmd: Received: %s" % str(r))
         return r
 
+    def send_visa_batch(self, cmds, verbose=False):
+        # Send several setting commands in one write, separated by ';' (each must start with ':').  Each one is
+        # remembered for replay_state() as if it had been sent on its own.
+        r = self.cmd(';'.join(cmds), verbose=verbose)
+        for cmd in cmds:
+            self.remember_setting(cmd)
+        if verbose:
+            print("send_visa_batch: Received: %s" % str(r))
+        return r
+
+    def remember_setting(self, cmd):
+        # Keep the most recent value of every setting command so replay_state() can restore it.
+        # Commands without an argument (*RST, :AUToscale, :FRANalysis:RUN...) and :DIGitize are actions, not
+        # settings.
+        header = cmd.split(' ')[0].upper()
+        if header == '*RST':
+            self.state.clear()
+            self.properties['Timebase_Scale_Current'] = None
+            self.properties['Acquire_Type_Current'] = 'NORMal'
+            self.properties['Acquire_Count_Current'] = 1
+            self.properties['FRA_WGEN_VPP_Current'] = None
+        elif header == ':AUTOSCALE':
+            # Autoscale rewrites the vertical, horizontal and trigger setup, and (with the default
+            # :AUToscale:AMODe NORMal) goes back to Normal acquisition.  The timebase is unknown until the next
+            # timebase_scale().
+            for key in list(self.state.keys()):
+                if key.startswith(':CHAN') or key.startswith(':TIM') or key.startswith(':TRIG') or \
+                        (key.startswith(':ACQ') and key.split(':')[-1][:4] in ['TYPE', 'COUN']):
+                    del self.state[key]
+            self.properties['Timebase_Scale_Current'] = None
+            self.properties['Acquire_Type_Current'] = 'NORMal'
+            self.properties['Acquire_Count_Current'] = 1
+        elif ' ' in cmd and not header.startswith('*') and not header.startswith(':MEAS') and \
+                not header.startswith(':DIG'):
+            # Re-insert so the replay order follows the order the settings were last made in.
+            self.state.pop(header, None)
+            self.state[header] = cmd
+        return
+
+    def replay_state(self, verbose=False):
+        # Called by VisaInstrument.reconnect() to restore the last-known settings on a fresh session.
+        for cmd in list(self.state.values()):
+            if verbose:
+                print("replay_state: %s" % cmd)
+            self.cmd(cmd, verbose=verbose)
+        return
+
+    def command_timeout(self, s, query=False, ascii=True):
+        # Per-command visa timeout in milliseconds.  Settings and simple queries get a short timeout so a wedged
+        # link fails fast; anything that waits on an acquisition is scaled by the time one acquisition takes
+        # (10 horizontal divisions, times the number of averages).
+        header = s.split(' ')[0].upper()
+        t_quick = self.properties['Timeout_Quick_ms']
+        # :FRANalysis:RUN returns at once; frequency_analysis_run() waits for the sweep with 'Timeout_FRA_ms'.
+        if header == ':AUTOSCALE':
+            t = self.properties['Timeout_Autoscale_ms']
+        elif query and (header.startswith(':MEAS') or header.startswith(':WAV') or header.startswith(':DIG')):
+            if self.properties['Timebase_Scale_Current'] is None:
+                t = self.timeout
+            else:
+                acq_ms = 10 * self.properties['Timebase_Scale_Current'] * 1000.0
+                if self.properties['Acquire_Type_Current'] == 'AVERage':
+                    acq_ms *= self.properties['Acquire_Count_Current']
+                # Allow a few acquisitions for the trigger to come around.
+                t = t_quick + 4 * acq_ms
+        else:
+            t = t_quick
+        if query and not ascii:
+            t += self.properties['Timeout_Transfer_ms']
+        return int(min(t, self.properties['Timeout_Max_ms']))
+
+    def transfer_timeout(self, s, n_bytes):
+        # command_timeout() for a binary block read of about n_bytes, plus the time the block takes on the link at
+        # 'Transfer_Bytes_per_Second'.  For reads too large for the fixed 'Timeout_Transfer_ms' allowance.
+        rate = self.properties['Transfer_Bytes_per_Second']
+        t = self.command_timeout(s, query=True, ascii=False) + 1000.0 * n_bytes / rate
+        return int(min(t, self.properties['Timeout_Max_ms']))
+
     # ----------------------------------------------------------------------------------
     #
     #             ***** Command List *****
@@ -160,6 +272,94 @@ class DSOX1000(VisaInstrument):
             print r
         return r
 
+    def arm_event_register(self, query=True, verbose=False):
+        # The :AER? query reads the Arm Event Register. After the Arm Event Register is read, it is cleared.
+        # A "1" indicates the trigger system is in the armed state, ready to accept a trigger.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            r['msg'] = 'arm_event_register: Malformed input.'
+            r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':AER?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def operation_register_condition(self, query=True, verbose=False):
+        # The :OPERegister:CONDition? query returns the integer value contained in the Operation Status Condition
+        # Register.
+        #
+        # Bit Name Description
+        # 11  OVLR Overload Set when any channel has an overload.
+        # 9   MTE  Mask Test Event Set when a mask test is running.
+        # 5   Wait Trig Set when the trigger is armed.
+        # 3   Run  Set when the oscilloscope is running (not stopped).
+        r = {'msg': "", 'err': 0}
+        if not query:
+            r['msg'] = 'operation_register_condition: Malformed input.'
+            r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':OPERegister:CONDition?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def digitize(self, source='CHANnel1', query=False, verbose=False):
+        # The :DIGitize command is a specialized RUN command. It causes the instrument to acquire waveforms according
+        # to the settings of the :ACQuire commands subsystem. When the acquisition is complete, the instrument is
+        # stopped.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            if source in ['CHANnel1', 'CHANnel2', 'FUNCtion', 'MATH']:
+                r['msg'] = self.send_visa_cmd(':DIGitize %s' % source, verbose=verbose)
+            else:
+                r['msg'] = 'digitize(): Malformed input.'
+                r['err'] = 1
+        else:
+            r['msg'] = ":DIGitize is write only."
+            r['err'] = 1
+        if verbose:
+            print r
+        return r
+
+    def run(self, query=False, verbose=False):
+        # The :RUN command starts repetitive acquisitions. This is the same as pressing the Run key on the front
+        # panel.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            r['msg'] = self.send_visa_cmd(':RUN', verbose=verbose)
+        else:
+            r['msg'] = ":RUN is write only."
+            r['err'] = 1
+        if verbose:
+            print r
+        return r
+
+    def single(self, query=False, verbose=False):
+        # The :SINGle command causes the oscilloscope to acquire a single trigger of data. This is the same as
+        # pressing the Single key on the front panel.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            r['msg'] = self.send_visa_cmd(':SINGle', verbose=verbose)
+        else:
+            r['msg'] = ":SINGle is write only."
+            r['err'] = 1
+        if verbose:
+            print r
+        return r
+
+    def stop(self, query=False, verbose=False):
+        # The :STOP command stops the acquisition. This is the same as pressing the Stop key on the front panel.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            r['msg'] = self.send_visa_cmd(':STOP', verbose=verbose)
+        else:
+            r['msg'] = ":STOP is write only."
+            r['err'] = 1
+        if verbose:
+            print r
+        return r
+
     # Acquire commands
     def acquire_count(self, counts=2, query=False, verbose=False):
         # In averaging mode, the :ACQuire:COUNt command specifies the number of values to be averaged for each time
@@ -170,6 +370,7 @@ class DSOX1000(VisaInstrument):
         if not query:
             counts = int(counts)
             r['msg'] = self.send_visa_cmd(':ACQuire:COUNt %s' % counts, verbose=verbose)
+            self.properties['Acquire_Count_Current'] = counts
         else:
             r['msg'] = self.send_visa_cmd(':ACQuire:COUNt?', query=query, verbose=verbose)
         if verbose:
@@ -186,6 +387,7 @@ class DSOX1000(VisaInstrument):
         if not query:
             if acquire_type in ['NORMal', 'AVERage', 'HRESolution', 'PEAK']:
                 r['msg'] = self.send_visa_cmd(':ACQuire:TYPE %s' % acquire_type, verbose=verbose)
+                self.properties['Acquire_Type_Current'] = acquire_type
             else:
                 r['msg'] = 'acquire_type(): Malformed input.'
                 r['err'] = 1
@@ -195,6 +397,55 @@ class DSOX1000(VisaInstrument):
             print r
         return r
 
+    def acquire_mode(self, mode='RTIMe', query=False, verbose=False):
+        # The :ACQuire:MODE command sets the acquisition mode of the oscilloscope.
+        # RTIMe: normal real time mode.
+        # SEGMented: segmented memory mode.  Each trigger fills the next of :ACQuire:SEGMented:COUNt segments, with
+        # only the re-arm time between them.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            if mode in ['RTIMe', 'SEGMented']:
+                r['msg'] = self.send_visa_cmd(':ACQuire:MODE %s' % mode, verbose=verbose)
+            else:
+                r['msg'] = 'acquire_mode(): Malformed input.'
+                r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':ACQuire:MODE?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def acquire_segmented_count(self, counts=2, query=False, verbose=False):
+        # The :ACQuire:SEGMented:COUNt command sets the number of memory segments to acquire.
+        # The segmented memory acquisition mode is enabled with the :ACQuire:MODE command.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            if self.is_number(counts) and 2 <= int(counts) <= self.properties['Segments_MAX']:
+                r['msg'] = self.send_visa_cmd(':ACQuire:SEGMented:COUNt %d' % int(counts), verbose=verbose)
+            else:
+                r['msg'] = 'acquire_segmented_count(): Malformed input.'
+                r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':ACQuire:SEGMented:COUNt?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def acquire_segmented_index(self, index=1, query=False, verbose=False):
+        # The :ACQuire:SEGMented:INDex command sets the index into the memory segments that have been acquired.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            if self.is_number(index) and 1 <= int(index) <= self.properties['Segments_MAX']:
+                r['msg'] = self.send_visa_cmd(':ACQuire:SEGMented:INDex %d' % int(index), verbose=verbose)
+            else:
+                r['msg'] = 'acquire_segmented_index(): Malformed input.'
+                r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':ACQuire:SEGMented:INDex?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
     # Channel commands
     def channel_coupling(self, channel=1, coupling='AC', query=False, verbose=False):
         # The :CHANnel<n>:COUPling command selects the input coupling for the specified channel. The coupling for each
@@ -355,17 +606,22 @@ class DSOX1000(VisaInstrument):
             print r
         return r
 
-    def frequency_analysis_run(self, query=False, verbose=False):
+    def frequency_analysis_run(self, timeout=None, query=False, verbose=False):
         # The :FRANalysis:RUN command performs the Frequency r['msg']onse Analysis. This analysis controls the built-in
         # waveform generator to sweep a sine wave across a range of frequencies while measuring the input to and
         # output from a device under test (DUT).
         #
         # It takes some time for the frequency sweep analysis to complete. You can query bit 0 of the
         # Standard Event Status Register (*ESR?) to find out when the analysis is complete.
+        # timeout: seconds to wait for the sweep, default 'Timeout_FRA_ms'.
         r = {'msg': "", 'err': 0}
         if not query:
+            if timeout is None:
+                timeout = self.properties['Timeout_FRA_ms'] / 1000.0
             self.send_visa_cmd(':FRANalysis:RUN', verbose=verbose)
-            r['msg'] = self.wait_for_esr(verbose=verbose)
+            r['msg'] = self.wait_for_esr(timeout=timeout, verbose=verbose)
+            if not r['msg']:
+                r['err'] = 1
         else:
             r['err'] = 1
             r['msg'] = 'frequency_analysis_run: Malformed input.'
@@ -380,6 +636,7 @@ class DSOX1000(VisaInstrument):
         if not query:
             if 1 <= channel <= self.properties['Channels']:
                 r['msg'] = self.send_visa_cmd(':FRANalysis:SOURce:INPut CHANnel%s' % channel, verbose=verbose)
+                self.properties['FRA_Input_Current'] = channel
             else:
                 r['err'] = 1
                 r['msg'] = 'frequency_analysis_source_input: Malformed input.'
@@ -396,6 +653,7 @@ class DSOX1000(VisaInstrument):
         if not query:
             if 1 <= channel <= self.properties['Channels']:
                 r['msg'] = self.send_visa_cmd(':FRANalysis:SOURce:OUTPut CHANnel%s' % channel, verbose=verbose)
+                self.properties['FRA_Output_Current'] = channel
             else:
                 r['err'] = 1
                 r['msg'] = 'frequency_analysis_source_output: Malformed input.'
@@ -424,6 +682,7 @@ class DSOX1000(VisaInstrument):
                     break
                 r['msg'] = self.send_visa_cmd(':FRANalysis:WGEN:VOLTage %s' % my_volts, verbose=verbose)
                 self.properties['WGEN_VPP_Current'] = float(my_volts)
+                self.properties['FRA_WGEN_VPP_Current'] = float(my_volts)
                 break
         else:
             r['msg'] = self.send_visa_cmd(':FRANalysis:WGEN:VOLTage?', query=query, verbose=verbose)
@@ -497,6 +756,7 @@ class DSOX1000(VisaInstrument):
             my_scale, err = self.get_nr3_format(scale)
             if not err:
                 r['msg'] = self.send_visa_cmd(':TIMebase:SCALe %s' % my_scale, query=query, verbose=verbose)
+                self.properties['Timebase_Scale_Current'] = float(my_scale)
             else:
                 r['msg'] = 'timebase_scale: Malformed input.'
                 r['err'] = 1
@@ -541,6 +801,22 @@ class DSOX1000(VisaInstrument):
             print r
         return r
 
+    def trigger_edge_level(self, level=0.0, query=False, verbose=False):
+        # The :TRIGger[:EDGE]:LEVel command sets the trigger level voltage for the active trigger source.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            my_level, err = self.get_nr3_format(level)
+            if not err:
+                r['msg'] = self.send_visa_cmd(':TRIGger:EDGE:LEVel %s' % my_level, query=query, verbose=verbose)
+            else:
+                r['msg'] = 'trigger_edge_level: Malformed input.'
+                r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':TRIGger:EDGE:LEVel?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
     def trigger_sweep(self, mode='AUTO', query=False, verbose=False):
         # The :TRIGger:SWEep command selects the trigger sweep mode. When AUTO sweep mode is selected, a baseline
         # is displayed in the absence of a signal. If a signal is present but the oscilloscope is not triggered, the
@@ -603,11 +879,12 @@ class DSOX1000(VisaInstrument):
         if not query:
             if my_load in ['ONEMeg', 'FIFTy']:
                 r['msg'] = self.send_visa_cmd(':FRANalysis:WGEN:LOAD %s' % my_load, verbose=verbose)
+                self.properties['WGEN_Load_Current'] = my_load
             else:
                 r['msg'] = 'wave_gen_load(): Malformed input.'
                 r['err'] = 1
         else:
-            r['msg'] = self.send_visa_cmd(':FRANalysis:WGEN:LOAD', query=query, verbose=verbose)
+            r['msg'] = self.send_visa_cmd(':FRANalysis:WGEN:LOAD?', query=query, verbose=verbose)
         if verbose:
             print r
         return r
@@ -648,7 +925,428 @@ class DSOX1000(VisaInstrument):
             print r
         return r
 
+    # Waveform Commands
+    def waveform_data(self, query=True, verbose=False, timeout=None):
+        # The :WAVeform:DATA? query returns the binary block of sampled data points transmitted using the IEEE
+        # 488.2 arbitrary block data format: #<N><length><data>, e.g. #800001000<1000 bytes of data>.
+        # The data points come from the :WAVeform:SOURce in the :WAVeform:FORMat.
+        # timeout: visa timeout in milliseconds, see transfer_timeout() for large blocks.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            r['err'] = 1
+            r['msg'] = 'waveform_data: Malformed input.'
+        else:
+            r['msg'] = self.send_visa_cmd(':WAVeform:DATA?', ascii=False, single_value=False, query=query,
+                                          verbose=verbose, timeout=timeout)
+        return r
+
+    def waveform_format(self, my_format='BYTE', query=False, verbose=False):
+        # The :WAVeform:FORMat command sets the data transmission mode for waveform data points.
+        # BYTE: 8 bit unsigned data, WORD: 16 bit data, ASCii: comma separated NR3 values.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            if my_format in ['BYTE', 'WORD', 'ASCii']:
+                r['msg'] = self.send_visa_cmd(':WAVeform:FORMat %s' % my_format, verbose=verbose)
+            else:
+                r['msg'] = 'waveform_format(): Malformed input.'
+                r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':WAVeform:FORMat?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def waveform_points(self, points=1000, query=False, verbose=False):
+        # The :WAVeform:POINts command sets the number of waveform points to be transferred with :WAVeform:DATA?.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            if self.is_number(points) and int(points) > 0:
+                r['msg'] = self.send_visa_cmd(':WAVeform:POINts %d' % int(points), verbose=verbose)
+            else:
+                r['msg'] = 'waveform_points(): Malformed input.'
+                r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':WAVeform:POINts?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def waveform_points_mode(self, mode='NORMal', query=False, verbose=False):
+        # The :WAVeform:POINts:MODE command sets the data record to be transferred with :WAVeform:DATA?.
+        # NORMal: the measurement record (screen), MAXimum / RAW: the raw acquisition record (requires a stopped
+        # acquisition).
+        r = {'msg': "", 'err': 0}
+        if not query:
+            if mode in ['NORMal', 'MAXimum', 'RAW']:
+                r['msg'] = self.send_visa_cmd(':WAVeform:POINts:MODE %s' % mode, verbose=verbose)
+            else:
+                r['msg'] = 'waveform_points_mode(): Malformed input.'
+                r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':WAVeform:POINts:MODE?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def waveform_preamble(self, query=True, verbose=False):
+        # The :WAVeform:PREamble query requests the preamble information for the selected waveform source.
+        # <format>, <type>, <points>, <count>, <xincrement>, <xorigin>, <xreference>, <yincrement>, <yorigin>,
+        # <yreference>
+        r = {'msg': "", 'err': 0}
+        if not query:
+            r['err'] = 1
+            r['msg'] = 'waveform_preamble: Malformed input.'
+        else:
+            r['msg'] = self.send_visa_cmd(':WAVeform:PREamble?', query=query, single_value=False,
+                                          verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def waveform_segmented_all(self, enable=True, query=False, verbose=False):
+        # The :WAVeform:SEGMented:ALL command turns on or off the "all segments" waveform data setting.
+        # When ON, :WAVeform:DATA? returns the data for all acquired segments in one block, segment after segment.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            if enable:
+                r['msg'] = self.send_visa_cmd(':WAVeform:SEGMented:ALL 1', verbose=verbose)
+            else:
+                r['msg'] = self.send_visa_cmd(':WAVeform:SEGMented:ALL 0', verbose=verbose)
+        else:
+            r['msg'] = self.send_visa_cmd(':WAVeform:SEGMented:ALL?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def waveform_segmented_count(self, query=True, verbose=False):
+        # The :WAVeform:SEGMented:COUNt query returns the number of memory segments in the acquired data.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            r['err'] = 1
+            r['msg'] = 'waveform_segmented_count: Malformed input.'
+        else:
+            r['msg'] = self.send_visa_cmd(':WAVeform:SEGMented:COUNt?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def waveform_segmented_ttag(self, query=True, verbose=False):
+        # The :WAVeform:SEGMented:TTAG query returns the time tag of the currently selected segment
+        # (:ACQuire:SEGMented:INDex), relative to the first segment, in seconds.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            r['err'] = 1
+            r['msg'] = 'waveform_segmented_ttag: Malformed input.'
+        else:
+            r['msg'] = self.send_visa_cmd(':WAVeform:SEGMented:TTAG?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
+    def waveform_source(self, source='CHANnel1', query=False, verbose=False):
+        # The :WAVeform:SOURce command selects the analog channel, function, or reference waveform to be used as
+        # the source for the :WAVeform commands.
+        r = {'msg': "", 'err': 0}
+        if not query:
+            if source in ['CHANnel1', 'CHANnel2', 'FUNCtion', 'MATH', 'WMEMory1', 'WMEMory2']:
+                r['msg'] = self.send_visa_cmd(':WAVeform:SOURce %s' % source, verbose=verbose)
+            else:
+                r['msg'] = 'waveform_source(): Malformed input.'
+                r['err'] = 1
+        else:
+            r['msg'] = self.send_visa_cmd(':WAVeform:SOURce?', query=query, verbose=verbose)
+        if verbose:
+            print r
+        return r
+
     # Utilities
+    def get_frequency_analysis_points(self, verbose=False):
+        # Read :FRANalysis:DATA? and parse it.  Returns a (steps, 4) NumPy array with the columns
+        # Frequency (Hz), Amplitude (Vpp), Gain (dB), Phase (deg), or an empty array on error.
+        r = self.frequency_analysis_data(verbose=verbose)
+        if r['err']:
+            return np.zeros((0, 4))
+        return self.parse_frequency_analysis_data(r['msg'])
+
+    @staticmethod
+    def parse_frequency_analysis_data(raw):
+        # Rows are "<step>, <frequency>, <amplitude>, <gain>, <phase>".  Skips the block header and title row.
+        if len(raw) > 1 and raw[0] == '#' and raw[1].isdigit():
+            raw = DSOX1000.get_ieee_block(raw)
+        rows = []
+        for line in raw.splitlines():
+            fields = line.split(',')
+            if len(fields) < 5:
+                continue
+            try:
+                int(fields[0])
+                rows.append([float(f) for f in fields[1:5]])
+            except ValueError:
+                continue
+        return np.array(rows).reshape(-1, 4)
+
+    def autoset_fast(self, channel=1, fingerprint=None, verbose=False):
+        # Host side replacement for :AUToscale on one channel.  Sets the channel scale (from 'Channels_V_per_Div')
+        # and offset, the timebase and an edge trigger at mid level; the acquire type, trigger sweep and channel
+        # display are restored afterwards, and nothing else is touched.
+        #
+        # 1. Coarse PEAK detect capture(s) at 'Autoset_Coarse_Timebase' for amplitude and offset.  PEAK keeps the
+        #    extremes of fast signals that a NORMal capture at this timebase would alias away.  Up to two more
+        #    captures zoom in on small signals.
+        # 2. The coarse capture gives a signal fingerprint.  If it is in the cache, one capture at the cached
+        #    timebase confirms the frequency and the cached settings are used.
+        # 3. Otherwise NORMal captures step through 'Autoset_Timebases' from fast to slow, and the first one showing
+        #    at least 'Autoset_Min_Cycles' periods gives the frequency.  Starting fast means this capture is never
+        #    aliased.
+        #
+        # The amplitude covers a whole period down to about 20 Hz (the 50 ms coarse window).  The frequency search
+        # covers 30 Hz (3 periods at 10 ms/div) to 250 MHz, or 3 Hz if the last rung of 100 ms/div is needed, which
+        # costs a 1 s acquisition (as does a DC signal).
+        #
+        # Results are cached by (channel, fingerprint).  Pass a fingerprint (e.g. the DUT type) to reuse a previous
+        # result without any capture.  r['msg'] returns the settings with the computed fingerprint and 'cached'.
+        r = {'msg': "", 'err': 0}
+        if (channel < 1) or (channel > self.properties['Channels']):
+            r['msg'] = 'autoset_fast: Channel out of range.'
+            r['err'] = 1
+            return r
+        if fingerprint is not None and (channel, fingerprint) in self.autoset_cache:
+            settings = dict(self.autoset_cache[(channel, fingerprint)], cached=True)
+            self.apply_autoset(channel, settings, verbose=verbose)
+            r['msg'] = settings
+            if verbose:
+                print r
+            return r
+
+        # The scope answers :ACQuire:TYPE? in the short form (NORM, AVER, HRES, PEAK).
+        acquire = self.acquire_type(query=True, verbose=verbose)['msg'].strip().upper()
+        acquire = ([t for t in ['NORMal', 'AVERage', 'HRESolution', 'PEAK'] if t.upper().startswith(acquire[:4])] or
+                   ['NORMal'])[0]
+        restore = [':ACQuire:TYPE %s' % acquire,
+                   ':TRIGger:SWEep %s' % self.trigger_sweep(query=True, verbose=verbose)['msg'].strip(),
+                   ':CHANnel%d:DISPlay %s' % (channel, self.send_visa_cmd(':CHANnel%d:DISPlay?' % channel,
+                                                                          query=True, verbose=verbose).strip())]
+        try:
+            settings = self.autoset_search(channel, verbose=verbose)
+        finally:
+            self.send_visa_batch(restore, verbose=verbose)
+            self.properties['Acquire_Type_Current'] = acquire
+        if settings is None:
+            r['msg'] = 'autoset_fast: No waveform data.'
+            r['err'] = 1
+            return r
+        if fingerprint is not None:
+            self.autoset_cache[(channel, fingerprint)] = dict(settings, cached=False)
+        r['msg'] = settings
+        if verbose:
+            print r
+        return r
+
+    def autoset_search(self, channel, verbose=False):
+        # The capture steps of autoset_fast().  Returns the applied settings, or None without waveform data.
+        v_per_div = self.properties['Channels_V_per_Div']
+        coarse_tb = self.properties['Autoset_Coarse_Timebase']
+        self.send_visa_batch([':CHANnel%d:DISPlay 1' % channel, ':ACQuire:TYPE PEAK', ':TRIGger:SWEep AUTO'],
+                             verbose=verbose)
+        self.properties['Acquire_Type_Current'] = 'PEAK'
+        scale, offset = v_per_div[-1], 0.0
+        for attempt in range(3):
+            times, volts = self.autoset_capture(channel, scale, offset, coarse_tb, verbose=verbose)
+            if volts is None or len(volts) < 2:
+                return None
+            coarse = self.estimate_signal(times, volts)
+            # A signal smaller than a couple of codes would be zoomed in on too far and clip; be conservative.
+            coarse['vpp'] = max(coarse['vpp'], 2 * scale * 10 / 256.0)
+            if self.pick_v_per_div(coarse['vpp']) >= scale:
+                break
+            scale, offset = self.pick_v_per_div(coarse['vpp']), coarse['offset']
+        q = scale / 2.0
+        fingerprint = '%s|%d|%d|%d' % (self.get_nr3_format(scale)[0], int(round(coarse['vpp'] / q)),
+                                       int(round(coarse['offset'] / q)), int(round(coarse['cycles'])))
+
+        self.acquire_type('NORMal', verbose=verbose)
+        cached = self.autoset_cache.get((channel, fingerprint))
+        if cached is not None:
+            times, volts = self.autoset_capture(channel, cached['v_per_div'], cached['offset'], cached['timebase'],
+                                                verbose=verbose)
+            est = self.estimate_signal(times, volts) if volts is not None and len(volts) > 1 else None
+            if est is not None and (cached['frequency'] is None or
+                                    (est['frequency'] and abs(est['frequency'] / cached['frequency'] - 1) < 0.2)):
+                settings = dict(cached, cached=True)
+                self.apply_autoset(channel, settings, verbose=verbose)
+                return settings
+
+        frequency = None
+        scale = self.pick_v_per_div(coarse['vpp'])
+        for timebase in self.properties['Autoset_Timebases']:
+            times, volts = self.autoset_capture(channel, scale, coarse['offset'], timebase, verbose=verbose)
+            if volts is None or len(volts) < 2:
+                return None
+            est = self.estimate_signal(times, volts)
+            if est['frequency'] and self.properties['Autoset_Min_Cycles'] <= est['cycles'] <= len(volts) / 8.0:
+                frequency = est['frequency']
+                break
+        settings = self.pick_autoset_settings(coarse['vpp'], coarse['offset'], frequency)
+        settings['fingerprint'] = fingerprint
+        settings['cached'] = False
+        self.autoset_cache[(channel, fingerprint)] = dict(settings)
+        self.apply_autoset(channel, settings, verbose=verbose)
+        return settings
+
+    def autoset_capture(self, channel, scale, offset, timebase, verbose=False):
+        self.send_visa_batch([':CHANnel%d:SCALe %s' % (channel, self.get_nr3_format(scale)[0]),
+                              ':CHANnel%d:OFFSet %s' % (channel, self.get_nr3_format(offset)[0]),
+                              ':TIMebase:SCALe %s' % self.get_nr3_format(timebase)[0]], verbose=verbose)
+        self.properties['Timebase_Scale_Current'] = timebase
+        self.digitize('CHANnel%d' % channel, verbose=verbose)
+        return self.get_waveform(channel=channel, points=self.properties['Autoset_Points'], verbose=verbose)
+
+    def apply_autoset(self, channel, settings, verbose=False):
+        self.send_visa_batch([':CHANnel%d:SCALe %s' % (channel, self.get_nr3_format(settings['v_per_div'])[0]),
+                              ':CHANnel%d:OFFSet %s' % (channel, self.get_nr3_format(settings['offset'])[0]),
+                              ':TIMebase:SCALe %s' % self.get_nr3_format(settings['timebase'])[0],
+                              ':TRIGger:MODE EDGE',
+                              ':TRIGger:EDGE:SOURce CHANnel%d' % channel,
+                              ':TRIGger:EDGE:LEVel %s' % self.get_nr3_format(settings['trigger_level'])[0]],
+                             verbose=verbose)
+        self.properties['Timebase_Scale_Current'] = settings['timebase']
+        return
+
+    @staticmethod
+    def estimate_signal(times, volts):
+        # Amplitude, centre and dominant frequency of a capture.  Percentiles keep single noise spikes out of the
+        # amplitude; the frequency is the largest non-DC FFT bin (Hann window, parabolic interpolation), or None
+        # for a flat signal.  'cycles' is the number of periods in the capture.
+        v_lo, v_hi = np.percentile(volts, [0.5, 99.5])
+        est = {'vpp': float(v_hi - v_lo), 'offset': float((v_hi + v_lo) / 2.0), 'frequency': None, 'cycles': 0.0}
+        n = len(volts)
+        spectrum = np.abs(np.fft.rfft((volts - volts.mean()) * np.hanning(n)))
+        if len(spectrum) > 3 and est['vpp'] > 0:
+            k = int(np.argmax(spectrum[1:]) + 1)
+            if spectrum[k] > 10 * np.median(spectrum[1:]):
+                delta = 0.0
+                if 0 < k < len(spectrum) - 1:
+                    a, b, c = spectrum[k - 1], spectrum[k], spectrum[k + 1]
+                    if (a - 2 * b + c) != 0:
+                        delta = 0.5 * (a - c) / (a - 2 * b + c)
+                est['cycles'] = float(k + delta)
+                est['frequency'] = est['cycles'] / ((times[1] - times[0]) * n)
+        return est
+
+    def pick_v_per_div(self, vpp):
+        # Smallest V/div that fits vpp in 'Autoset_Fill_Div' divisions.
+        v_per_div = self.properties['Channels_V_per_Div']
+        fits = [v for v in v_per_div if vpp <= v * self.properties['Autoset_Fill_Div']]
+        return fits[0] if fits else v_per_div[-1]
+
+    def pick_autoset_settings(self, vpp, offset, frequency):
+        # Vertical scale from pick_v_per_div(), and a 1-2-5 timebase showing 'Autoset_Periods' periods across the
+        # 10 horizontal divisions.
+        if frequency:
+            timebase = self.properties['Autoset_Periods'] / (10.0 * frequency)
+            exponent = int(np.floor(np.log10(timebase)))
+            timebase = min(float('%de%d' % (m, exponent)) for m in [1, 2, 5, 10]
+                           if float('%de%d' % (m, exponent)) >= timebase * 0.999)
+            timebase = min(max(timebase, self.properties['Timebase_MIN']), self.properties['Timebase_MAX'])
+        else:
+            timebase = self.properties['Autoset_Coarse_Timebase']
+        return {'vpp': vpp, 'offset': offset, 'frequency': frequency, 'v_per_div': self.pick_v_per_div(vpp),
+                'timebase': float(timebase), 'trigger_level': offset}
+
+    def get_waveform(self, channel=1, points=1000, verbose=False):
+        # Download the current acquisition of one channel in BYTE format and scale it with the preamble.
+        # Returns (times, volts) as NumPy arrays, or (None, None) on error.
+        if (channel < 1) or (channel > self.properties['Channels']):
+            if verbose:
+                print("get_waveform: Channel out of range.")
+            return None, None
+        self.waveform_source('CHANnel%d' % channel, verbose=verbose)
+        self.waveform_format('BYTE', verbose=verbose)
+        self.waveform_points(points, verbose=verbose)
+        pre = self.waveform_preamble(verbose=verbose)['msg']
+        raw = self.waveform_data(verbose=verbose)['msg']
+        codes = np.frombuffer(self.get_ieee_block(raw), dtype=np.uint8)
+        x_inc, x_orig, x_ref = pre[4], pre[5], pre[6]
+        y_inc, y_orig, y_ref = pre[7], pre[8], pre[9]
+        times = (np.arange(len(codes)) - x_ref) * x_inc + x_orig
+        volts = (codes - y_ref) * y_inc + y_orig
+        return times, volts
+
+    def get_segments(self, channel=1, counts=10, points=1000, timeout=60, use_all=True, verbose=False):
+        # Segmented acquisition of one channel: fill counts segments in a single arm, then download them all.
+        # The time tags are fetched with one batched query per 'Segments_Per_Query' segments; the samples with one
+        # :WAVeform:SEGMented:ALL block when use_all (falling back to one query per segment if the scope returns
+        # less than that).  The scope is left in segmented mode; call acquire_mode('RTIMe') to go back.
+        # Returns (times, volts, time_tags): volts is a (segments, points) NumPy array, time_tags the trigger time
+        # of each segment relative to the first.  (None, None, None) on error.
+        if (channel < 1) or (channel > self.properties['Channels']):
+            if verbose:
+                print("get_segments: Channel out of range.")
+            return None, None, None
+        if self.acquire_mode('SEGMented', verbose=verbose)['err'] or \
+                self.acquire_segmented_count(counts, verbose=verbose)['err']:
+            return None, None, None
+        self.single(verbose=verbose)
+        if not self.wait_for_stop(timeout=timeout, verbose=verbose):
+            if verbose:
+                print("get_segments: Timed out waiting for %d segments." % counts)
+            return None, None, None
+        n = int(float(self.waveform_segmented_count(verbose=verbose)['msg']))
+        if n < 1:
+            return None, None, None
+
+        # Time tags: chain index + query pairs, the replies come back ';' separated in one read.
+        time_tags = []
+        step = self.properties['Segments_Per_Query']
+        for first in range(1, n + 1, step):
+            indexes = range(first, min(first + step, n + 1))
+            cmd = ';'.join([':ACQuire:SEGMented:INDex %d;:WAVeform:SEGMented:TTAG?' % i for i in indexes])
+            replies = self.send_visa_cmd(cmd, query=True, verbose=verbose).strip().split(';')
+            # A missing or extra reply would shift every following time tag against the rows of volts.
+            if len(replies) != len(indexes) or not all(self.is_number(t) for t in replies):
+                if verbose:
+                    print("get_segments: Expected %d time tags for segments %d-%d, received: %s" %
+                          (len(indexes), indexes[0], indexes[-1], self.make_nice_ascii(';'.join(replies))))
+                return None, None, None
+            time_tags.extend([float(t) for t in replies])
+        time_tags = np.array(time_tags)
+
+        self.waveform_source('CHANnel%d' % channel, verbose=verbose)
+        self.waveform_format('BYTE', verbose=verbose)
+        self.waveform_points(points, verbose=verbose)
+        pre = self.waveform_preamble(verbose=verbose)['msg']
+        codes = None
+        if use_all:
+            self.waveform_segmented_all(True, verbose=verbose)
+            # One block of n segments: the fixed transfer allowance would time out (and reconnect) on large ones.
+            block = self.get_ieee_block(self.waveform_data(
+                verbose=verbose, timeout=self.transfer_timeout(':WAVeform:DATA?', n * points))['msg'])
+            self.waveform_segmented_all(False, verbose=verbose)
+            if len(block) and len(block) % n == 0 and len(block) // n >= pre[2]:
+                codes = np.frombuffer(block, dtype=np.uint8).reshape(n, -1)
+        if codes is None:
+            rows = []
+            for i in range(1, n + 1):
+                raw = self.send_visa_cmd(':ACQuire:SEGMented:INDex %d;:WAVeform:DATA?' % i, query=True, ascii=False,
+                                         single_value=False, verbose=verbose,
+                                         timeout=self.transfer_timeout(':WAVeform:DATA?', points))
+                rows.append(np.frombuffer(self.get_ieee_block(raw), dtype=np.uint8))
+            length = min(len(row) for row in rows)
+            codes = np.vstack([row[:length] for row in rows])
+        x_inc, x_orig, x_ref = pre[4], pre[5], pre[6]
+        y_inc, y_orig, y_ref = pre[7], pre[8], pre[9]
+        times = (np.arange(codes.shape[1]) - x_ref) * x_inc + x_orig
+        volts = (codes - y_ref) * y_inc + y_orig
+        return times, volts, time_tags
+
+    @staticmethod
+    def get_ieee_block(raw):
+        # Strip the IEEE 488.2 definite length header (#<N><length>) from a binary block response.
+        start = raw.index('#')
+        n = int(raw[start + 1])
+        length = int(raw[start + 2:start + 2 + n])
+        return raw[start + 2 + n:start + 2 + n + length]
+
     def get_nr3_format(self, my_num):
         # For numeric program data, you have the option of using exponential notation or using suffix multipliers
         # to indicate the numeric value. The following numbers are all equal:
@@ -683,6 +1381,21 @@ class DSOX1000(VisaInstrument):
                 return False
         return True
 
+    def wait_for_stop(self, sample_period=0.01, timeout=10, verbose=False):
+        # pole the Operation Status Condition Register until the Run bit clears (single acquisition complete),
+        # or timeouts
+        time_start = time.time()
+        while 1:
+            resp = self.operation_register_condition()
+            my_oper = int(resp['msg'])
+            if verbose:
+                print("wait_for_stop: received operation condition value of: %d" % my_oper)
+            if not my_oper & 0b00001000:
+                return True
+            if (time.time() - time_start) > timeout:
+                return False
+            time.sleep(sample_period)
+
     @staticmethod
     def is_number(s):
         try:
@@ -0,0 +1,185 @@
+import sys
+import os.path
+import time
+import threading
+from multiprocessing.pool import ThreadPool
+import numpy as np
+from DSO1000X import DSOX1000
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FleetFrame(object):
+    # One synchronized capture across the fleet.
+    #   waveforms[name][channel] = (times, volts)
+    #   timestamps[name] = {'armed': t, 'stopped': t, 'done': t}   (host time.time())
+    #   skew = {'armed': stats, 'stopped': stats}, stats = {'spread', 'std'} in seconds across the scopes
+    def __init__(self, index, t_trigger):
+        self.index = index
+        self.t_trigger = t_trigger
+        self.waveforms = {}
+        self.timestamps = {}
+        self.skew = {}
+        self.errors = {}
+        self.t_done = None
+
+    def samples(self):
+        return sum(len(v) for w in self.waveforms.values() for (t, v) in w.values() if v is not None)
+
+    def compute_skew(self):
+        for key in ['armed', 'stopped', 'done']:
+            t = np.array([ts[key] for ts in self.timestamps.values() if ts.get(key) is not None])
+            if len(t):
+                self.skew[key] = {'spread': float(t.max() - t.min()), 'std': float(t.std())}
+        return self.skew
+
+
+class ScopeFleet(object):
+    # Drives a rack of DSOX1000s in parallel: one worker thread per scope, so N scopes take about as long per step
+    # as one.  Synchronized captures arm every scope on the shared rear panel EXT TRIG IN.
+    #
+    #   fleet = ScopeFleet(['USB0::...::INSTR', 'USB0::...::INSTR'])
+    #   fleet.apply([('timebase_scale', {'scale': 1e-4}), ('channel_scale', {'channel': 1, 'scale': 0.5})])
+    #   fleet.setup_external_trigger()
+    #   frame = fleet.capture(channels=[1, 2])
+    #
+    # instrument_factory(address, name) builds each instrument; see simulated_scope.simulated_dsox1000 for a
+    # local simulated rack.
+    def __init__(self, addresses, names=None, instrument_factory=None, verbose=False):
+        if names is None:
+            names = ['DSOX1000_%d' % i for i in range(len(addresses))]
+        if instrument_factory is None:
+            instrument_factory = lambda address, name: DSOX1000(address=address, my_name=name, verbose=verbose)
+        self.names = list(names)
+        self.verbose = verbose
+        self.pool = ThreadPool(max(1, len(addresses)))
+        self.frames = 0
+        self.stats = {'frames': 0, 'samples': 0, 'capture_time': 0.0}
+        self.lock = threading.Lock()
+        self.scopes = self.pool.map(lambda a: instrument_factory(a[0], a[1]), zip(addresses, self.names))
+
+    def map(self, fn):
+        # Run fn(scope) on every scope concurrently.  Returns the results in fleet order.
+        return self.pool.map(fn, self.scopes)
+
+    def apply(self, config):
+        # Apply a configuration to every scope concurrently.  config is a list of (method_name, kwargs), applied
+        # in order on each scope.  Returns {name: [failed r dicts]}, empty when everything was accepted.
+        def configure(scope):
+            failed = []
+            for method, kwargs in config:
+                r = getattr(scope, method)(**kwargs)
+                if r['err']:
+                    failed.append(r)
+            return failed
+        return dict((n, f) for n, f in zip(self.names, self.map(configure)) if f)
+
+    def setup_external_trigger(self, sweep='NORMal'):
+        # Every scope waits for the shared EXT TRIG IN edge.
+        return self.apply([('trigger_mode', {'mode': 'EDGE'}),
+                           ('trigger_edge_source', {'source': 'EXTernal'}),
+                           ('trigger_sweep', {'mode': sweep})])
+
+    def arm(self, timeout=5.0, sample_period=0.005):
+        # Put every scope into a single acquisition and wait until all of them report armed.
+        # Returns {name: host time armed, or None}.
+        def arm_one(scope):
+            scope.single()
+            time_start = time.time()
+            while (time.time() - time_start) < timeout:
+                if int(scope.arm_event_register()['msg']):
+                    return time.time()
+                time.sleep(sample_period)
+            return None
+        return dict(zip(self.names, self.map(arm_one)))
+
+    def collect(self, channels=(1,), points=1000, timeout=10.0):
+        # Wait for every scope's single acquisition to finish, then download the channels in parallel.
+        # Returns a list of (stopped, done, {channel: (times, volts)}) in fleet order.
+        def collect_one(scope):
+            if not scope.wait_for_stop(timeout=timeout):
+                return None, None, {}
+            t_stopped = time.time()
+            waves = {}
+            for ch in channels:
+                waves[ch] = scope.get_waveform(channel=ch, points=points)
+            return t_stopped, time.time(), waves
+        return self.map(collect_one)
+
+    def capture(self, channels=(1,), points=1000, fire_trigger=None, timeout=10.0):
+        # One synchronized frame: arm all, fire the shared trigger (fire_trigger() if the host drives it, otherwise
+        # the external hardware does), collect all.
+        time_start = time.time()
+        armed = self.arm(timeout=timeout)
+        t_trigger = fire_trigger() if fire_trigger is not None else None
+        results = self.collect(channels=channels, points=points, timeout=timeout)
+        with self.lock:
+            frame = FleetFrame(self.frames, t_trigger)
+            self.frames += 1
+        for name, (t_stopped, t_done, waves) in zip(self.names, results):
+            frame.timestamps[name] = {'armed': armed[name], 'stopped': t_stopped, 'done': t_done}
+            frame.waveforms[name] = waves
+            if armed[name] is None:
+                frame.errors[name] = 'not armed'
+            elif t_stopped is None:
+                frame.errors[name] = 'no trigger'
+        frame.t_done = time.time()
+        frame.compute_skew()
+        with self.lock:
+            self.stats['frames'] += 1
+            self.stats['samples'] += frame.samples()
+            self.stats['capture_time'] += frame.t_done - time_start
+        if self.verbose:
+            print("ScopeFleet.capture(): frame %d, %d samples, skew %s, errors %s" % (frame.index, frame.samples(),
+                                                                                    str(frame.skew),
+                                                                                    str(frame.errors)))
+        return frame
+
+    def throughput(self):
+        # Aggregate frames and samples per second of capture time so far.
+        with self.lock:
+            t = self.stats['capture_time']
+            return {'frames': self.stats['frames'],
+                    'samples': self.stats['samples'],
+                    'frames_per_second': self.stats['frames'] / t if t else 0.0,
+                    'samples_per_second': self.stats['samples'] / t if t else 0.0}
+
+    def close(self):
+        self.map(lambda scope: scope.close())
+        self.pool.close()
+        self.pool.join()
+        return
+
+
+if __name__ == "__main__":
+    # Check the fleet against a simulated rack: no capture without the shared trigger, a complete frame with it,
+    # and aggregate throughput scaling with the number of scopes.
+    import simulated_scope
+
+    def make_rack(n, trigger):
+        return ScopeFleet(['SIM%d::DSOX1102G::INSTR' % i for i in range(n)],
+                          instrument_factory=lambda address, name: simulated_scope.simulated_dsox1000(
+                              address, name, trigger=trigger, latency=0.002, bytes_per_second=2e5))
+
+    my_trigger = simulated_scope.SimulatedTrigger()
+    my_fleet = make_rack(2, my_trigger)
+    my_fleet.setup_external_trigger()
+    my_frame = my_fleet.capture(channels=[1], fire_trigger=None, timeout=1.0)
+    print("No trigger fired: errors %s" % str(my_frame.errors))
+    assert sorted(my_frame.errors.values()) == ['no trigger', 'no trigger']
+    my_frame = my_fleet.capture(channels=[1, 2], fire_trigger=my_trigger.fire, timeout=1.0)
+    print("Trigger fired: errors %s, skew %s" % (str(my_frame.errors), str(my_frame.skew)))
+    assert my_frame.errors == {} and my_frame.samples() == 2 * 2 * 1000
+    my_fleet.close()
+
+    rate_one = None
+    for n_scopes in [1, 2, 4, 8]:
+        my_trigger = simulated_scope.SimulatedTrigger()
+        my_fleet = make_rack(n_scopes, my_trigger)
+        my_fleet.setup_external_trigger()
+        for k in range(5):
+            my_fleet.capture(channels=[1, 2], fire_trigger=my_trigger.fire, timeout=1.0)
+        rate = my_fleet.throughput()['samples_per_second']
+        rate_one = rate_one or rate
+        print("%d scopes: %.0f samples/s, %.2f x one scope" % (n_scopes, rate, rate / rate_one))
+        my_fleet.close()
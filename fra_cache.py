@@ -0,0 +1,149 @@
+import sys
+import os.path
+import time
+import json
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# :FRANalysis:FREQuency:STARt / STOP only accept these values, so the cache works in the bands between them.
+FRA_BAND_EDGES = [20, 100, 1000, 10000, 100000, 1000000, 10000000, 20000000]
+
+
+class FraSweepCache(object):
+    # Cache of frequency response analysis results, so a sweep only re-measures the bands that are missing or stale.
+    #
+    # Entries are keyed by DUT ID and the scope's FRA setup (input / output channels, FRA wave gen voltage and load,
+    # read back from the scope, so front panel changes and *RST are seen).  Each key holds one entry per band of FRA_BAND_EDGES, with the parsed points,
+    # when they were measured and how long the sweep took.
+    #
+    #   cache = FraSweepCache('fra_cache.json', max_age=3600)
+    #   points, report = cache.sweep(my_scope, 'board_17')
+    #   cache.invalidate(my_scope, 'board_17', 1000, 100000)    # re-measure 1 kHz - 100 kHz next time
+    #
+    # A band measured on its own gets the scope's full number of sweep points, so re-measured bands may be denser
+    # than the ones they replace.  A run that fails or times out (band_timeout seconds per band) stores nothing.
+    def __init__(self, path=None, max_age=None, band_timeout=120, verbose=False):
+        self.path = path
+        self.max_age = max_age          # seconds, None = never stale
+        self.band_timeout = band_timeout
+        self.verbose = verbose
+        self.entries = {}
+        self.stats = {'hits': 0, 'misses': 0, 'time_saved': 0.0, 'time_spent': 0.0}
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def make_key(scope, dut_id):
+        # Four quick queries, against a sweep that takes minutes.
+        inputs = scope.frequency_analysis_source_input(query=True)['msg'].strip()
+        outputs = scope.frequency_analysis_source_output(query=True)['msg'].strip()
+        volts = scope.frequency_analysis_wave_gen_voltage(query=True)['msg'].strip()
+        load = scope.wave_gen_load(query=True)['msg'].strip()
+        if scope.is_number(volts):
+            volts = scope.get_nr3_format(float(volts))[0]
+        return '%s|%s|%s|%s|%s' % (dut_id, inputs, outputs, volts, load)
+
+    @staticmethod
+    def bands(start, stop):
+        return [(lo, hi) for lo, hi in zip(FRA_BAND_EDGES[:-1], FRA_BAND_EDGES[1:]) if lo >= start and hi <= stop]
+
+    def is_fresh(self, band, now):
+        if band is None or band.get('stale'):
+            return False
+        return self.max_age is None or (now - band['t_measured']) <= self.max_age
+
+    def sweep(self, scope, dut_id, start=20, stop=20000000, verbose=False):
+        # Return the merged (points, 4) curve from start to stop, running :FRANalysis:RUN only over the missing or
+        # stale bands (contiguous bands share one run).  Also returns a report of this call:
+        # {'hits', 'misses', 'hit_rate', 'time_spent', 'time_saved', 'failed'}, failed listing the (start, stop) of
+        # runs that did not complete.  Bands of a failed run keep their previous points, if any.
+        if start not in FRA_BAND_EDGES or stop not in FRA_BAND_EDGES or start >= stop:
+            raise ValueError("FraSweepCache.sweep(): start and stop must be in %s." % str(FRA_BAND_EDGES))
+        key = self.make_key(scope, dut_id)
+        entry = self.entries.setdefault(key, {})
+        now = time.time()
+        bands = self.bands(start, stop)
+        stale = [b for b in bands if not self.is_fresh(entry.get(str(b[0])), now)]
+        report = {'hits': len(bands) - len(stale), 'misses': len(stale), 'time_spent': 0.0, 'time_saved': 0.0,
+                  'failed': []}
+        for b in bands:
+            if b not in stale:
+                report['time_saved'] += entry[str(b[0])]['duration']
+
+        # Group contiguous stale bands into runs.
+        runs = []
+        for b in stale:
+            if runs and runs[-1][1] == b[0]:
+                runs[-1] = (runs[-1][0], b[1])
+            else:
+                runs.append(b)
+        for lo, hi in runs:
+            if verbose or self.verbose:
+                print("FraSweepCache.sweep(): %s, measuring %s - %s Hz" % (key, lo, hi))
+            time_start = time.time()
+            run_bands = self.bands(lo, hi)
+            points = np.zeros((0, 4))
+            ok = not scope.frequency_analysis_frequency_start(lo, verbose=verbose)['err'] and \
+                not scope.frequency_analysis_frequency_stop(hi, verbose=verbose)['err']
+            if ok:
+                r = scope.frequency_analysis_run(timeout=self.band_timeout * len(run_bands), verbose=verbose)
+                ok = not r['err'] and r['msg'] is True
+            if ok:
+                points = scope.get_frequency_analysis_points(verbose=verbose)
+                ok = len(points) > 0
+            duration = time.time() - time_start
+            report['time_spent'] += duration
+            if not ok:
+                if verbose or self.verbose:
+                    print("FraSweepCache.sweep(): %s, %s - %s Hz failed, nothing stored" % (key, lo, hi))
+                report['failed'].append((lo, hi))
+                continue
+            for b_lo, b_hi in run_bands:
+                # Each point belongs to the band it starts; the top edge of the run goes to the last band.
+                if b_hi == hi:
+                    mask = (points[:, 0] >= b_lo) & (points[:, 0] <= b_hi)
+                else:
+                    mask = (points[:, 0] >= b_lo) & (points[:, 0] < b_hi)
+                entry[str(b_lo)] = {'points': points[mask].tolist(),
+                                    't_measured': time.time(),
+                                    'duration': duration * mask.sum() / max(len(points), 1)}
+
+        n = report['hits'] + report['misses']
+        report['hit_rate'] = float(report['hits']) / n if n else 0.0
+        self.stats['hits'] += report['hits']
+        self.stats['misses'] += report['misses']
+        self.stats['time_saved'] += report['time_saved']
+        self.stats['time_spent'] += report['time_spent']
+        if len(runs) > len(report['failed']) and self.path is not None:
+            self.save()
+        if verbose or self.verbose:
+            print("FraSweepCache.sweep(): %s" % str(report))
+
+        rows = [row for b in bands if str(b[0]) in entry for row in entry[str(b[0])]['points']]
+        points = np.array(rows).reshape(-1, 4)
+        # Neighbouring runs both measure their shared band edge; keep one point per frequency.
+        freqs, first = np.unique(points[:, 0], return_index=True)
+        return points[first], report
+
+    def invalidate(self, scope, dut_id, start=20, stop=20000000):
+        # Mark the bands from start to stop stale, so the next sweep re-measures them.
+        entry = self.entries.get(self.make_key(scope, dut_id), {})
+        for lo, hi in self.bands(start, stop):
+            if str(lo) in entry:
+                entry[str(lo)]['stale'] = True
+        return
+
+    def hit_rate(self):
+        n = self.stats['hits'] + self.stats['misses']
+        return float(self.stats['hits']) / n if n else 0.0
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.entries, f)
+        return
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            self.entries = json.load(f)
+        return
@@ -0,0 +1,240 @@
+import sys
+import os.path
+import time
+import itertools
+import threading
+import Queue
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Lower number runs first.  Control (setting the wave gen, trigger...) beats measurements, which beat bulk
+# downloads (waveform data, FRA data).
+PRIORITY_CONTROL = 0
+PRIORITY_MEASURE = 1
+PRIORITY_BULK = 2
+PRIORITIES = [PRIORITY_CONTROL, PRIORITY_MEASURE, PRIORITY_BULK]
+PRIORITY_STOP = 99
+
+
+class ScheduledCommand(object):
+    # One queued call of an instrument method.  wait() blocks until the worker has run it.  If wait() times out
+    # before the worker has started the call, the call is cancelled and will not run.
+    def __init__(self, method, args, kwargs, priority):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.t_submit = time.time()
+        self.t_start = None
+        self.t_done = None
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def start(self):
+        # Called by the worker.  Returns False if the call was cancelled.
+        with self.lock:
+            if self.cancelled:
+                return False
+            self.t_start = time.time()
+            return True
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            with self.lock:
+                if self.t_start is None:
+                    self.cancelled = True
+                    raise RuntimeError("ScheduledCommand.wait(): %s not started within %s seconds, cancelled." %
+                                       (str(self.method), str(timeout)))
+            raise RuntimeError("ScheduledCommand.wait(): %s still running after %s seconds." % (str(self.method),
+                                                                                              str(timeout)))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class Reservation(object):
+    # Exclusive use of the instrument for a multi-command sequence.  Use as a context manager:
+    #
+    #   with scheduler.reserve() as res:
+    #       res.call('wave_gen_frequency', 1000)
+    #       res.call('measure_volts_pp', query=True)
+    #
+    # Once granted, the worker thread waits until the reservation is released, so nothing else touches the
+    # session in between.  Commands in the reservation run directly on the reserving thread.  Going through the
+    # scheduler (call(), submit(), a proxy or another reserve()) from inside the reservation on the same thread
+    # would wait on the blocked worker forever, so it raises a RuntimeError instead.
+    def __init__(self, scheduler, priority, timeout=None):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.timeout = timeout
+        self.t_submit = None
+        self.t_start = None
+        self.owner = None
+        self.granted = threading.Event()
+        self.released = threading.Event()
+
+    def __enter__(self):
+        self.owner = threading.current_thread()
+        self.t_submit = time.time()
+        self.scheduler.enqueue(self)
+        if not self.granted.wait(self.timeout):
+            # Too late to withdraw from the queue; release immediately once the worker gets to it.
+            self.released.set()
+            raise RuntimeError("Reservation: not granted within %s seconds." % str(self.timeout))
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.released.set()
+        return False
+
+    def call(self, method, *args, **kwargs):
+        if not self.granted.is_set() or self.released.is_set():
+            raise RuntimeError("Reservation.call(): reservation is not active.")
+        return self.scheduler.resolve(method)(*args, **kwargs)
+
+
+class SchedulerProxy(object):
+    # Looks like the instrument, but every method call goes through the scheduler at a fixed priority.
+    #   scope = scheduler.proxy(PRIORITY_MEASURE)
+    #   scope.measure_volts_pp(query=True)
+    # Only methods are available; data attributes (properties, state...) belong to the worker thread.
+    def __init__(self, scheduler, priority):
+        self._scheduler = scheduler
+        self._priority = priority
+
+    def __getattr__(self, name):
+        if not callable(getattr(self._scheduler.instrument, name)):
+            raise AttributeError("SchedulerProxy: %s is not a method of the instrument." % name)
+        def scheduled_call(*args, **kwargs):
+            return self._scheduler.call(name, args=args, kwargs=kwargs, priority=self._priority)
+        return scheduled_call
+
+
+class CommandScheduler(object):
+    # Owns an instrument session and runs every command on a single worker thread, taken from a priority queue.
+    # A command is a whole instrument method call (e.g. measure_volts_pp(query=True)), so the write and read of a
+    # query can never be split by another thread.
+    def __init__(self, instrument, name="Command_Scheduler", verbose=False):
+        self.instrument = instrument
+        self.name = name
+        self.verbose = verbose
+        self.queue = Queue.PriorityQueue()
+        self.sequence = itertools.count()   # keeps FIFO order within a priority
+        self.lock = threading.Lock()
+        self.stats = {}
+        for p in PRIORITIES:
+            self.stats[p] = {'pending': 0, 'completed': 0, 'errors': 0, 'wait_total': 0.0, 'wait_max': 0.0,
+                             'run_total': 0.0, 'cancelled': 0}
+        self.active_reservation = None
+        self.worker = threading.Thread(target=self.run, name=name)
+        self.worker.daemon = True
+        self.running = True
+        self.worker.start()
+
+    def resolve(self, method):
+        # Method may be given by name ('measure_volts_pp') or as a callable taking the instrument.
+        if callable(method):
+            instrument = self.instrument
+            return lambda *args, **kwargs: method(instrument, *args, **kwargs)
+        return getattr(self.instrument, method)
+
+    def enqueue(self, job):
+        if not self.running:
+            raise RuntimeError("CommandScheduler: %s is closed." % self.name)
+        active = self.active_reservation
+        if active is not None and active.owner is threading.current_thread() and not active.released.is_set():
+            raise RuntimeError("CommandScheduler: this thread holds a reservation, use Reservation.call().")
+        with self.lock:
+            self.stats[job.priority]['pending'] += 1
+        self.queue.put((job.priority, next(self.sequence), job))
+
+    def submit(self, method, args=(), kwargs=None, priority=PRIORITY_CONTROL):
+        # Queue a call and return immediately.  Call .wait() on the returned ScheduledCommand for the result.
+        if priority not in PRIORITIES:
+            raise ValueError("CommandScheduler.submit(): unknown priority %s." % str(priority))
+        job = ScheduledCommand(method, tuple(args), dict(kwargs or {}), priority)
+        self.enqueue(job)
+        return job
+
+    def call(self, method, args=(), kwargs=None, priority=PRIORITY_CONTROL, timeout=None):
+        return self.submit(method, args=args, kwargs=kwargs, priority=priority).wait(timeout)
+
+    def reserve(self, priority=PRIORITY_CONTROL, timeout=None):
+        if priority not in PRIORITIES:
+            raise ValueError("CommandScheduler.reserve(): unknown priority %s." % str(priority))
+        return Reservation(self, priority, timeout=timeout)
+
+    def proxy(self, priority=PRIORITY_CONTROL):
+        return SchedulerProxy(self, priority)
+
+    def run(self):
+        while 1:
+            priority, seq, job = self.queue.get()
+            if job is None:
+                break
+            if isinstance(job, Reservation):
+                job.t_start = time.time()
+            elif not job.start():
+                with self.lock:
+                    self.stats[priority]['pending'] -= 1
+                    self.stats[priority]['cancelled'] += 1
+                continue
+            wait = job.t_start - job.t_submit
+            err = False
+            if isinstance(job, Reservation):
+                self.active_reservation = job
+                job.granted.set()
+                job.released.wait()
+                self.active_reservation = None
+            else:
+                try:
+                    job.result = self.resolve(job.method)(*job.args, **job.kwargs)
+                except Exception as e:
+                    job.error = e
+                    err = True
+                job.t_done = time.time()
+                job.done.set()
+            run = time.time() - job.t_start
+            if self.verbose:
+                print("CommandScheduler.run(): %s priority %d waited %.4f s, ran %.4f s" %
+                      (str(getattr(job, 'method', 'reservation')), priority, wait, run))
+            with self.lock:
+                s = self.stats[priority]
+                s['pending'] -= 1
+                s['completed'] += 1
+                s['errors'] += int(err)
+                s['wait_total'] += wait
+                s['wait_max'] = max(s['wait_max'], wait)
+                s['run_total'] += run
+
+    def queue_depth(self):
+        # Number of commands (and reservations) waiting or running, per priority.
+        with self.lock:
+            return dict((p, self.stats[p]['pending']) for p in PRIORITIES)
+
+    def metrics(self):
+        # Queue depth plus completed, failed and cancelled counts and wait / run times (seconds) per priority.
+        r = {}
+        with self.lock:
+            for p in PRIORITIES:
+                s = self.stats[p]
+                n = s['completed']
+                r[p] = {'pending': s['pending'],
+                        'completed': n,
+                        'errors': s['errors'],
+                        'cancelled': s['cancelled'],
+                        'wait_mean': s['wait_total'] / n if n else 0.0,
+                        'wait_max': s['wait_max'],
+                        'run_mean': s['run_total'] / n if n else 0.0}
+        return r
+
+    def close(self, timeout=None):
+        # Finish everything already queued, then stop the worker.  The instrument itself is left open.
+        if self.running:
+            self.running = False
+            self.queue.put((PRIORITY_STOP, next(self.sequence), None))
+            self.worker.join(timeout)
+        return
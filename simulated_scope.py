@@ -0,0 +1,261 @@
+import sys
+import os.path
+import time
+import threading
+import numpy as np
+from DSO1000X import DSOX1000
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SimulatedTrigger(object):
+    # Stands in for the shared EXT TRIG IN line of a rack of scopes.  Every simulated session created with the same
+    # SimulatedTrigger sees the same trigger edge.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.t_fire = None
+
+    def fire(self):
+        with self.lock:
+            self.t_fire = time.time()
+        return self.t_fire
+
+
+class SimulatedSession(object):
+    # Answers the subset of the DSOX1000 SCPI command set used by DSO1000X.py, with the same call signatures as a
+    # pyvisa resource (write, read, read_raw, query, query_ascii_values, close).
+    #
+    # Channel 1 sees the waveform generator output, channel 2 the same signal through a DUT with half the gain and
+    # a small phase lag.  Pass signal=f(channel, times) to simulate something else.
+    def __init__(self, resource_name, trigger=None, signal=None, latency=0.0005, bytes_per_second=2e6,
+                 noise=0.002, dut=None, fra_step_time=0.01):
+        self.resource_name = resource_name
+        self.timeout = 2000
+        self.read_termination = None
+        self.trigger = trigger
+        self.signal = signal
+        self.latency = latency              # seconds per write
+        self.bytes_per_second = bytes_per_second
+        self.noise = noise                  # volts rms
+        self.dut = dut                      # f(frequency) -> complex gain for FRA, default RC low pass at 10 kHz
+        self.fra_step_time = fra_step_time  # seconds per FRA sweep step
+        self.fra_data = ''
+        self.settings = {}
+        self.output = []
+        self.esr = 0
+        self.running = True
+        self.t_arm = None
+        self.t_trigger = None
+        self.time_tags = []
+        self.closed = False
+
+    # pyvisa resource interface
+    def write(self, s):
+        if self.closed:
+            raise RuntimeError("SimulatedSession: %s is closed." % self.resource_name)
+        time.sleep(self.latency)
+        for part in s.split(';'):
+            part = part.strip()
+            if part:
+                self.execute(part)
+        return len(s), 0
+
+    def read(self):
+        resp = ';'.join(self.output)
+        self.output = []
+        time.sleep(len(resp) / self.bytes_per_second)
+        return resp + '\n'
+
+    def read_raw(self):
+        return self.read()
+
+    def query(self, s):
+        self.write(s)
+        return self.read()
+
+    def query_ascii_values(self, s):
+        return [float(v) for v in self.query(s).strip().split(',') if v]
+
+    def close(self):
+        self.closed = True
+
+    # SCPI handling
+    def execute(self, cmd):
+        header, _, arg = cmd.partition(' ')
+        header = header.upper()
+        if header.endswith('?'):
+            self.output.append(self.respond(header[:-1], arg.strip()))
+        else:
+            self.apply(header, arg.strip())
+
+    def apply(self, header, arg):
+        if header == '*RST':
+            self.settings.clear()
+        elif header == '*CLS':
+            self.esr = 0
+        elif header == ':SINGLE':
+            self.running = True
+            self.t_arm = time.time()
+            self.t_trigger = None
+        elif header == ':RUN':
+            self.running = True
+            self.t_arm = None
+        elif header == ':STOP':
+            self.running = False
+        elif header == ':AUTOSCALE':
+            self.esr |= 1
+        elif header == ':FRANALYSIS:RUN':
+            self.fra_data = self.frequency_analysis()
+            self.esr |= 1
+        else:
+            self.settings[header] = arg
+
+    def respond(self, header, arg):
+        if header == '*IDN':
+            return 'KEYSIGHT TECHNOLOGIES,DSO-X 1102G,%s,SIMULATED' % self.resource_name
+        if header == '*ESR':
+            esr, self.esr = self.esr, 0
+            return str(esr)
+        if header == '*OPC':
+            return '1'
+        if header == ':AER':
+            return '1' if self.t_arm is not None else '0'
+        if header == ':OPEREGISTER:CONDITION':
+            self.update_acquisition()
+            return str(0b00001000 if self.running else 0)
+        if header == ':FRANALYSIS:DATA':
+            return self.make_block(self.fra_data)
+        if header == ':WAVEFORM:SEGMENTED:COUNT':
+            return str(len(self.time_tags))
+        if header == ':WAVEFORM:SEGMENTED:TTAG':
+            return repr(self.time_tags[self.segment() - 1]) if self.time_tags else '0'
+        if header == ':WAVEFORM:PREAMBLE':
+            return ','.join([repr(v) for v in self.preamble()])
+        if header == ':WAVEFORM:DATA':
+            return self.make_block(self.waveform_codes().tobytes())
+        return self.settings.get(header, '0')
+
+    def update_acquisition(self):
+        # A single acquisition completes on the first trigger after it was armed.
+        if self.t_arm is None or not self.running:
+            return
+        source = self.settings.get(':TRIGGER:EDGE:SOURCE', 'WGEN').upper()
+        if source.startswith('EXT'):
+            if self.trigger is None or self.trigger.t_fire is None or self.trigger.t_fire < self.t_arm:
+                return
+            self.t_trigger = self.trigger.t_fire
+        else:
+            self.t_trigger = time.time()
+        self.running = False
+        self.t_arm = None
+        if self.settings.get(':ACQUIRE:MODE', 'RTIMe').upper().startswith('SEGM'):
+            # Bursty events: random gaps between segment triggers, first segment at 0.
+            n = int(self.setting(':ACQUIRE:SEGMENTED:COUNT', 2))
+            self.time_tags = list(np.cumsum(np.concatenate([[0.0], np.random.exponential(1e-3, n - 1)])))
+        else:
+            self.time_tags = []
+
+    # Frequency response analysis
+    def frequency_analysis(self):
+        start = self.setting(':FRANALYSIS:FREQUENCY:START', 20)
+        stop = self.setting(':FRANALYSIS:FREQUENCY:STOP', 20000000)
+        steps = int(self.setting(':FRANALYSIS:SWEEP:POINTS', 50))
+        vpp = self.setting(':FRANALYSIS:WGEN:VOLTAGE', 0.2)
+        freqs = np.logspace(np.log10(start), np.log10(stop), steps)
+        if self.dut is not None:
+            gain = np.array([self.dut(f) for f in freqs])
+        else:
+            gain = 1.0 / (1.0 + 1j * freqs / 10000.0)
+        time.sleep(steps * self.fra_step_time)
+        lines = ['#, Frequency (Hz), Amplitude (Vpp), Gain (dB), Phase (\xb0)']
+        for i, (f, g) in enumerate(zip(freqs, gain)):
+            lines.append('%d, %.1f, %.4f, %.2f, %.2f' % (i + 1, f, vpp, 20 * np.log10(abs(g)),
+                                                         np.degrees(np.angle(g))))
+        return '\n'.join(lines) + '\n'
+
+    # Waveforms
+    def setting(self, header, default):
+        try:
+            return float(self.settings.get(header, default))
+        except ValueError:
+            return default
+
+    def channel(self):
+        source = self.settings.get(':WAVEFORM:SOURCE', 'CHANnel1')
+        return int(source[-1]) if source[-1].isdigit() else 1
+
+    def segment(self):
+        return min(max(int(self.setting(':ACQUIRE:SEGMENTED:INDEX', 1)), 1), max(len(self.time_tags), 1))
+
+    def preamble(self):
+        # <format>, <type>, <points>, <count>, <xincrement>, <xorigin>, <xreference>, <yincrement>, <yorigin>,
+        # <yreference>
+        points = int(self.setting(':WAVEFORM:POINTS', 1000))
+        tb = self.setting(':TIMEBASE:SCALE', 500e-9)
+        ch = self.channel()
+        scale = self.setting(':CHANNEL%d:SCALE' % ch, 1.0)
+        offset = self.setting(':CHANNEL%d:OFFSET' % ch, 0.0)
+        return [0, 0, points, 1, 10 * tb / points, -5 * tb, 0, 10 * scale / 256.0, offset, 128]
+
+    def signal_volts(self, channel, times):
+        if self.signal is not None:
+            return self.signal(channel, times)
+        freq = self.setting(':WGEN:FREQUENCY', 1000.0)
+        vpp = self.setting(':WGEN:VOLTAGE', 0.5)
+        gain, lag = (1.0, 0.0) if channel == 1 else (0.5, 0.1)
+        return gain * vpp / 2.0 * np.sin(2 * np.pi * freq * times - lag)
+
+    def sample_volts(self, channel, times, x_inc):
+        # NORMal takes one sample per point.  PEAK detect keeps the maximum (even points) or minimum (odd points)
+        # of the signal over each sample interval, here approximated from random sub-samples.
+        if not self.settings.get(':ACQUIRE:TYPE', 'NORMal').upper().startswith('PEAK'):
+            return self.signal_volts(channel, times)
+        sub = times[:, None] + np.random.uniform(0, x_inc, (len(times), 32))
+        volts = self.signal_volts(channel, sub.ravel()).reshape(sub.shape)
+        return np.where(np.arange(len(times)) % 2 == 0, volts.max(axis=1), volts.min(axis=1))
+
+    def waveform_codes(self):
+        pre = self.preamble()
+        points, x_inc, x_orig, y_inc, y_orig, y_ref = pre[2], pre[4], pre[5], pre[7], pre[8], pre[9]
+        times = np.arange(points) * x_inc + x_orig
+        if not self.time_tags:
+            offsets = [0.0]
+        elif self.settings.get(':WAVEFORM:SEGMENTED:ALL', '0') == '1':
+            offsets = self.time_tags
+        else:
+            offsets = [self.time_tags[self.segment() - 1]]
+        volts = np.concatenate([self.sample_volts(self.channel(), times + t, x_inc) for t in offsets])
+        volts += np.random.normal(0, self.noise, len(volts))
+        codes = np.round((volts - y_orig) / y_inc + y_ref)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    @staticmethod
+    def make_block(data):
+        length = str(len(data))
+        return '#%d%s%s' % (len(length), length, data)
+
+
+class SimulatedResourceManager(object):
+    # Drop-in for visa.ResourceManager that opens SimulatedSessions.  Keyword arguments go to every session.
+    def __init__(self, trigger=None, **session_kwargs):
+        self.trigger = trigger
+        self.session_kwargs = session_kwargs
+        self.sessions = []
+
+    def open_resource(self, visa_address):
+        session = SimulatedSession(visa_address, trigger=self.trigger, **self.session_kwargs)
+        self.sessions.append(session)
+        return session
+
+    def list_resources(self):
+        return tuple(s.resource_name for s in self.sessions)
+
+    def close(self):
+        return
+
+
+def simulated_dsox1000(address='SIM0::DSOX1102G::INSTR', my_name="Simulated_DSOX1102G", trigger=None,
+                       **session_kwargs):
+    # A DSOX1000 driving a simulated session instead of real hardware.
+    return DSOX1000(address=address, my_name=my_name, verbose=False,
+                    resource_manager=SimulatedResourceManager(trigger=trigger, **session_kwargs))
@@ -1,5 +1,6 @@
 import sys
 import os.path
+import time
 import visa
 # pyvisa from https://pyvisa.readthedocs.io/en/stable/
 
@@ -10,9 +11,18 @@ VISA_ADDRESS = 'USB0::0x2A8D::0x1797::CN57266528::0::INSTR'
 
 
 class VisaInstrument(object):
-    def __init__(self, visa_address=VISA_ADDRESS, name="Default_Visa_Instrument", verbose=True):
-        self.timeout = 10000    # specify visa IO timeout in milliseconds.
-        self.resourceManager = visa.ResourceManager()
+    def __init__(self, visa_address=VISA_ADDRESS, name="Default_Visa_Instrument", verbose=True,
+                 resource_manager=None):
+        self.timeout = 10000    # specify default visa IO timeout in milliseconds.
+        self.reconnect_attempts = 2     # number of times an I/O error triggers a reconnect and retry.
+        self.reconnect_delay = 1.0      # seconds to wait before reopening the session.
+        self.visa_address = visa_address
+        self.name = name
+        self.replaying = False
+        # Pass a resource manager to use another visa backend (e.g. visa.ResourceManager('@py')) or a simulator.
+        if resource_manager is None:
+            resource_manager = visa.ResourceManager()
+        self.resourceManager = resource_manager
         if verbose:
             print("%s" % self.resourceManager)
             print("Found visa devices:")
@@ -21,20 +31,73 @@ class VisaInstrument(object):
             print
             print("Opening VisaInstrument (%s) at: %s" % (name, visa_address))
 
-        self.session = self.resourceManager.open_resource(visa_address)
-        self.session.timeout = self.timeout
+        self.open_session()
 
-        print("Opened visa device with timeout = %s" % str(self.session.timeout))
-        print
+        if verbose:
+            print("Opened visa device with timeout = %s" % str(self.session.timeout))
+            print
+
+        if verbose:
+            print("ID: %s" % str(self.identification_number(verbose=True)))
+            print
+
+    def open_session(self):
+        self.session = self.resourceManager.open_resource(self.visa_address)
+        self.session.timeout = self.timeout
 
         # For Serial and TCP/IP socket connections enable the read Termination Character, or read's will timeout
         if self.session.resource_name.startswith('ASRL') or self.session.resource_name.endswith('SOCKET'):
             self.session.read_termination = '\n'
+
+    def reconnect(self, verbose=False):
+        # Drop the (possibly wedged) session, reopen it, and let the subclass restore its settings.
         if verbose:
-            print("ID: %s" % str(self.identification_number(verbose=True)))
-            print
+            print("visa_io.reconnect(): Reopening %s at: %s" % (self.name, self.visa_address))
+        try:
+            self.session.close()
+        except visa.VisaIOError:
+            pass
+        time.sleep(self.reconnect_delay)
+        self.open_session()
+        self.replaying = True
+        try:
+            self.replay_state(verbose=verbose)
+        finally:
+            self.replaying = False
+        return
+
+    def replay_state(self, verbose=False):
+        # Called after a reconnect.  Subclasses re-send their last-known settings here.
+        return
+
+    def command_timeout(self, s, query=False, ascii=True):
+        # Timeout in milliseconds for a single command.  Subclasses derive this from the instrument state.
+        return self.timeout
+
+    def cmd(self, s, query=False, ascii=True, single_value=True, verbose=False, timeout=None):
+        if timeout is None:
+            timeout = self.command_timeout(s, query=query, ascii=ascii)
+        attempt = 0
+        while 1:
+            try:
+                self.session.timeout = timeout
+                return self.cmd_once(s, query=query, ascii=ascii, single_value=single_value, verbose=verbose)
+            except visa.VisaIOError as e:
+                while 1:
+                    if self.replaying or attempt >= self.reconnect_attempts:
+                        raise
+                    attempt += 1
+                    if verbose:
+                        print("visa_io.cmd(): I/O error on %s (%s), reconnect attempt %d." %
+                              (self.make_nice_ascii(s), str(e), attempt))
+                    try:
+                        self.reconnect(verbose=verbose)
+                        break
+                    except visa.VisaIOError:
+                        # The instrument is still gone.  Try again until we run out of attempts.
+                        pass
 
-    def cmd(self, s, query=False, ascii=True, single_value=True, verbose=False):
+    def cmd_once(self, s, query=False, ascii=True, single_value=True, verbose=False):
         if query:
             if ascii:
                 if single_value: